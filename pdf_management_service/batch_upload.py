@@ -4,17 +4,95 @@ Batch Chapter PDF Upload Script
 Upload multiple chapter PDFs at once
 """
 
+import atexit
+import contextlib
+import hashlib
+import json
+import logging
+import mmap
 import os
-import requests
+import queue
+import random
+import re
+import sys
+import threading
 import time
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from logging.handlers import QueueHandler, QueueListener
+from types import MappingProxyType
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+json_loads: Callable[[Union[bytes, bytearray]], Any]
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+try:
+    from requests_toolbelt.multipart.encoder import MultipartEncoder
+    TOOLBELT_AVAILABLE = True
+except ImportError:
+    TOOLBELT_AVAILABLE = False
+
+logger = logging.getLogger("batch_upload")
+
+# Listener started by _ensure_logging() when an importer hasn't configured logging
+_log_listener: Optional[QueueListener] = None
+_log_setup_lock = threading.Lock()
 
 # Configuration
 API_BASE_URL = "http://localhost:5001"
 UPLOAD_ENDPOINT = f"{API_BASE_URL}/upload_chapter_pdf"
 
+# Number of chapter uploads allowed in flight at once
+MAX_CONCURRENT_UPLOADS = 4
+
+# Shared HTTP session - keeps connections to the PDF service alive between uploads.
+# One keep-alive connection per upload worker; pool_block stops extra throwaway
+# connections from being opened, so a whole batch reuses the same few sockets.
+# (connection-level retries only; 429/5xx responses are handled by upload_chapter_pdf)
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=MAX_CONCURRENT_UPLOADS,
+    pool_block=True,
+    max_retries=Retry(total=3, backoff_factor=0.5)
+))
+SESSION.headers.update({'Connection': 'keep-alive'})
+
+# Retry policy for busy/overloaded server responses
+MAX_UPLOAD_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1.0   # seconds
+RETRY_MAX_DELAY = 30.0   # seconds
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Read buffer for streaming PDFs to the server
+PDF_READ_BUFFER_SIZE = 256 * 1024
+
+# Files smaller than this cannot be a real chapter PDF
+MIN_PDF_SIZE = 1024
+
+# PDFs at least this large are memory-mapped for the streaming encoder
+PDF_MMAP_MIN_SIZE = 4 * 1024 * 1024
+
+# Idempotency keys of chapters the server has already accepted (next to this script,
+# so it is found whatever the working directory; pass force=True / --force to ignore it)
+UPLOAD_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".upload_cache.json")
+_upload_cache: Optional[Set[str]] = None
+_upload_cache_lock = threading.Lock()
+
+# Reusable read buffers for hashing, one per upload worker. Only needed when
+# hashlib.file_digest is missing (Python < 3.11), so they are allocated on first use
+HASH_BUFFER_SIZE = 1 << 20
+_hash_buffers: "queue.LifoQueue[bytearray]" = queue.LifoQueue()
+
 # Chapter mapping - modify these according to your PDF files
-CHAPTER_MAPPING = {
+CHAPTER_MAPPING = MappingProxyType({
     # Format: "your_pdf_filename.pdf": ("chapter_id", "chapter_name")
     "chapter1_real_numbers.pdf": ("real_numbers", "বাস্তব সংখ্যা (Real Numbers)"),
     "chapter2_sets_functions.pdf": ("sets_functions", "সেট ও ফাংশন (Sets and Functions)"),
@@ -22,170 +100,416 @@ CHAPTER_MAPPING = {
     "chapter4_indices_logarithms.pdf": ("indices_logarithms", "সূচক ও লগারিদম (Indices and Logarithms)"),
     "chapter5_linear_equations.pdf": ("linear_equations", "এক চলকবিশিষ্ট সমীকরণ (Linear Equations)"),
     # Add more chapters as needed...
-}
+})
+
+# Auto-detection patterns
+AUTO_DETECT_PATTERNS = MappingProxyType({
+    'real': ('real_numbers', 'বাস্তব সংখ্যা (Real Numbers)'),
+    'set': ('sets_functions', 'সেট ও ফাংশন (Sets and Functions)'),
+    'algebra': ('algebraic_expressions', 'বীজগাণিতিক রাশি (Algebraic Expressions)'),
+    'indic': ('indices_logarithms', 'সূচক ও লগারিদম (Indices and Logarithms)'),
+    'linear': ('linear_equations', 'এক চলকবিশিষ্ট সমীকরণ (Linear Equations)'),
+    'line': ('lines_angles_triangles', 'রেখা, কোণ ও ত্রিভুজ (Lines, Angles and Triangles)'),
+    'geometry': ('practical_geometry', 'ব্যবহারিক জ্যামিতি (Practical Geometry)'),
+    'circle': ('circles', 'বৃত্ত (Circles)'),
+    'trigon': ('trigonometric_ratios', 'ত্রিকোণমিতিক অনুপাত (Trigonometric Ratios)'),
+    'distance': ('distance_height', 'দূরত্ব ও উচ্চতা (Distance and Height)'),
+    'ratio': ('algebraic_ratios', 'বীজগাণিতিক অনুপাত ও সমানুপাত (Algebraic Ratios)'),
+    'simultaneous': ('simultaneous_equations', 'দুই চলকবিশিষ্ট সরল সহসমীকরণ (Simultaneous Linear Equations)'),
+    'finite': ('finite_series', 'সসীম ধারা (Finite Series)'),
+    'similarity': ('ratio_similarity_symmetry', 'অনুপাত, সদৃশতা ও প্রতিসমতা (Ratio, Similarity and Symmetry)'),
+    'area': ('area_theorems', 'ক্ষেত্রফল সম্পর্কিত উপপাদ্য ও সম্পাদ্য (Area Related Theorems)'),
+    'mensur': ('mensuration', 'পরিমিতি (Mensuration)'),
+    'statistic': ('statistics', 'পরিসংখ্যান (Statistics)'),
+})
 
-def upload_chapter_pdf(pdf_file_path, class_level, chapter_id, chapter_name, subject="Mathematics"):
-    """Upload a single chapter PDF"""
+# Single alternation over all patterns, longest first so e.g. "linear" wins over "line"
+AUTO_DETECT_RE = re.compile("|".join(
+    re.escape(pattern) for pattern in sorted(AUTO_DETECT_PATTERNS, key=len, reverse=True)
+))
+
+def _load_upload_cache() -> Set[str]:
+    """Load the set of already-uploaded idempotency keys (once per process)"""
+    
+    global _upload_cache
+    if _upload_cache is None:
+        try:
+            with open(UPLOAD_CACHE_FILE, 'r', encoding='utf-8') as f:
+                _upload_cache = set(json.load(f))
+        except FileNotFoundError:
+            _upload_cache = set()
+        except ValueError as e:
+            logger.warning(f"⚠️  Ignoring unreadable upload cache {UPLOAD_CACHE_FILE}: {e}")
+            _upload_cache = set()
+    return _upload_cache
+
+def _is_already_uploaded(idempotency_key: str) -> bool:
+    with _upload_cache_lock:
+        return idempotency_key in _load_upload_cache()
+
+def _mark_uploaded(idempotency_key: str) -> None:
+    with _upload_cache_lock:
+        cache = _load_upload_cache()
+        cache.add(idempotency_key)
+        # Write a sibling file and swap it in, so a crash mid-write can't truncate the cache
+        temp_file = f"{UPLOAD_CACHE_FILE}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(sorted(cache), f, indent=2)
+        os.replace(temp_file, UPLOAD_CACHE_FILE)
+
+def compute_idempotency_key(pdf_file_path: str, class_level: Union[int, str], chapter_id: str) -> str:
+    """Key identifying one chapter upload: target chapter + SHA-256 of the PDF content"""
     
-    if not os.path.exists(pdf_file_path):
-        return {"error": f"File not found: {pdf_file_path}"}
+    with open(pdf_file_path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            # Python 3.11+: hashes straight from the file's buffer in C (OpenSSL, SHA-NI where available)
+            digest = hashlib.file_digest(f, 'sha256')
+        else:
+            digest = hashlib.sha256()
+            try:
+                buf = _hash_buffers.get_nowait()
+            except queue.Empty:
+                buf = bytearray(HASH_BUFFER_SIZE)
+            try:
+                view = memoryview(buf)
+                while True:
+                    n = f.readinto(buf)
+                    if not n:
+                        break
+                    digest.update(view[:n])
+                view.release()
+            finally:
+                _hash_buffers.put(buf)
+    return f"{class_level}/{chapter_id}/{digest.hexdigest()}"
+
+def _open_pdf(pdf_file_path: str) -> BinaryIO:
+    """Open a PDF for one sequential pass with a large read buffer"""
     
-    files = {
-        'pdf_file': ('chapter.pdf', open(pdf_file_path, 'rb'), 'application/pdf')
-    }
+    fd = os.open(pdf_file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    if hasattr(os, 'posix_fadvise'):
+        # Ask the kernel for aggressive read-ahead (not available on Windows/macOS)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    return os.fdopen(fd, 'rb', buffering=PDF_READ_BUFFER_SIZE)
+
+class _MappedPDF:
+    """Read-only mmap of a PDF that reports its remaining length to MultipartEncoder"""
+    
+    def __init__(self, fh: BinaryIO) -> None:
+        self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self._map, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self._map.madvise(mmap.MADV_SEQUENTIAL)
+    
+    @property
+    def len(self) -> int:
+        # MultipartEncoder keeps reading while this is > 0 (len() of an mmap never shrinks)
+        return len(self._map) - self._map.tell()
+    
+    def read(self, size: int = -1) -> bytes:
+        return self._map.read(size)
+    
+    def __enter__(self) -> "_MappedPDF":
+        return self
+    
+    def __exit__(self, *exc_info: Any) -> None:
+        self._map.close()
+
+def _pdf_body(fh: BinaryIO) -> Any:
+    """Memory-map large PDFs so the encoder reads straight from the page cache"""
     
+    if os.fstat(fh.fileno()).st_size < PDF_MMAP_MIN_SIZE:
+        return contextlib.nullcontext(fh)
+    return _MappedPDF(fh)
+
+def _post_chapter_pdf(pdf_file_path: str, data: Dict[str, str], idempotency_key: str) -> requests.Response:
+    """POST one chapter PDF to the upload endpoint and return the response"""
+    
+    headers = {'X-Idempotency-Key': idempotency_key}
+    
+    with _open_pdf(pdf_file_path) as fh:
+        if TOOLBELT_AVAILABLE:
+            # Stream the multipart body from disk instead of building it in memory
+            with _pdf_body(fh) as body:
+                encoder = MultipartEncoder(fields={
+                    **data,
+                    'pdf_file': ('chapter.pdf', body, 'application/pdf')
+                })
+                headers['Content-Type'] = encoder.content_type
+                return SESSION.post(UPLOAD_ENDPOINT, data=encoder, headers=headers,
+                                    stream=True, timeout=300)  # 5 minute timeout
+        
+        files = {
+            'pdf_file': ('chapter.pdf', fh, 'application/pdf')
+        }
+        return SESSION.post(UPLOAD_ENDPOINT, files=files, data=data, headers=headers,
+                            stream=True, timeout=300)  # 5 minute timeout
+
+def _read_json(response: requests.Response) -> Dict[str, Any]:
+    """Decode a streamed JSON response, reading the body in 64KB chunks"""
+    
+    raw = bytearray()
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        raw.extend(chunk)
+    return json_loads(raw)
+
+def _retry_delay(response: requests.Response, attempt: int) -> float:
+    """Seconds to wait before retrying: honor Retry-After, else exponential backoff with jitter"""
+    
+    retry_after = response.headers.get('Retry-After')
+    if retry_after:
+        try:
+            return min(RETRY_MAX_DELAY, max(0.0, float(retry_after)))
+        except ValueError:
+            pass  # HTTP-date form - fall back to backoff
+    
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+def upload_chapter_pdf(pdf_file_path: str, class_level: Union[int, str], chapter_id: str,
+                       chapter_name: str, subject: str = "Mathematics", force: bool = False) -> Dict[str, Any]:
+    """Upload a single chapter PDF (force=True uploads even if the cache says it is already there)"""
+    
+    _ensure_logging()
     data = {
-        'class_level': class_level,
+        'class_level': str(class_level),
         'chapter_id': chapter_id,
         'chapter_name': chapter_name,
         'subject': subject
     }
     
     try:
-        print(f"📤 Uploading {chapter_name}...")
-        response = requests.post(UPLOAD_ENDPOINT, files=files, data=data, timeout=300)  # 5 minute timeout
+        idempotency_key = compute_idempotency_key(pdf_file_path, class_level, chapter_id)
+        if not force and _is_already_uploaded(idempotency_key):
+            logger.info(f"⏭️  SKIPPING {chapter_name} - already uploaded (unchanged)")
+            return {"success": True, "skipped": True}
+        
+        logger.info(f"📤 Uploading {chapter_name}...")
+        
+        for attempt in range(MAX_UPLOAD_ATTEMPTS):
+            response = _post_chapter_pdf(pdf_file_path, data, idempotency_key)
+            
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt == MAX_UPLOAD_ATTEMPTS - 1:
+                break
+            
+            delay = _retry_delay(response, attempt)
+            response.close()  # hand the connection back to the pool while we wait
+            logger.info(f"⏳ Server busy (HTTP {response.status_code}) for {chapter_name}, retrying in {delay:.1f}s...")
+            time.sleep(delay)
         
         if response.status_code == 200:
-            result = response.json()
+            result = _read_json(response)
             if result.get('success'):
-                print(f"✅ SUCCESS: {chapter_name}")
-                print(f"   📄 Chunks: {result.get('chunks_created', 'N/A')}")
-                print(f"   🧠 Pinecone: {result.get('pinecone_stored', 'N/A')}")
-                print(f"   ☁️  Firebase: {'Yes' if result.get('firebase_url') else 'No'}")
+                _mark_uploaded(idempotency_key)
+                logger.info(f"✅ SUCCESS: {chapter_name}")
+                logger.info(f"   📄 Chunks: {result.get('chunks_created', 'N/A')}")
+                logger.info(f"   🧠 Pinecone: {result.get('pinecone_stored', 'N/A')}")
+                logger.info(f"   ☁️  Firebase: {'Yes' if result.get('firebase_url') else 'No'}")
             else:
-                print(f"❌ FAILED: {chapter_name} - {result.get('error', 'Unknown error')}")
+                logger.error(f"❌ FAILED: {chapter_name} - {result.get('error', 'Unknown error')}")
             return result
         else:
-            print(f"❌ HTTP Error {response.status_code}: {response.text}")
+            logger.error(f"❌ HTTP Error {response.status_code}: {response.text}")
             return {"error": f"HTTP {response.status_code}"}
             
     except Exception as e:
-        print(f"❌ Error uploading {chapter_name}: {e}")
+        logger.error(f"❌ Error uploading {chapter_name}: {e}")
         return {"error": str(e)}
-    finally:
-        files['pdf_file'][1].close()
 
-def batch_upload_chapters(pdf_folder, class_level, subject="Mathematics"):
-    """Upload all chapter PDFs from a folder"""
+def setup_logging() -> QueueListener:
+    """Send log records through a queue so upload workers never block on stdout
     
-    if not os.path.exists(pdf_folder):
-        print(f"❌ Folder not found: {pdf_folder}")
-        return
+    Call it (and stop() the returned listener) to see progress when importing this module;
+    otherwise the upload functions set it up on first use if logging isn't configured at all.
+    """
     
-    print(f"🚀 Starting batch upload from: {pdf_folder}")
-    print(f"📚 Class: {class_level}, Subject: {subject}")
-    print("=" * 60)
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return listener
+
+def _ensure_logging() -> None:
+    """Print progress to stdout unless the caller has configured logging"""
+    
+    global _log_listener
+    with _log_setup_lock:
+        if _log_listener is None and not logger.handlers and not logging.getLogger().handlers:
+            _log_listener = setup_logging()
+            atexit.register(_log_listener.stop)  # flush queued messages at exit
+
+def validate_pdf_file(pdf_path: str, file_size: Optional[int] = None) -> Optional[str]:
+    """Cheap client-side check (size + %PDF- magic), returns an error message or None"""
+    
+    try:
+        if file_size is None:
+            file_size = os.stat(pdf_path).st_size
+        if file_size < MIN_PDF_SIZE:
+            return f"file too small ({file_size} bytes)"
+        
+        with open(pdf_path, 'rb') as f:
+            if f.read(5) != b'%PDF-':
+                return "not a PDF (missing %PDF- header)"
+    except OSError as e:
+        # Unreadable or removed mid-scan: skip this file, not the whole batch
+        return f"cannot read file ({e.strerror or e})"
+    return None
+
+def match_mapped_chapter(pdf_file: str) -> Optional[Tuple[str, str]]:
+    """Look up a PDF filename in CHAPTER_MAPPING"""
+    return CHAPTER_MAPPING.get(pdf_file)
+
+def detect_chapter(pdf_file: str) -> Optional[Tuple[str, str]]:
+    """Detect the chapter from filename patterns"""
+    match = AUTO_DETECT_RE.search(pdf_file.lower())
+    return AUTO_DETECT_PATTERNS[match.group(0)] if match else None
+
+def iter_chapter_files(
+    pdf_folder: str,
+    match_chapter: Callable[[str], Optional[Tuple[str, str]]]
+) -> Iterator[Tuple[str, str, Optional[Tuple[str, str]], Optional[str]]]:
+    """Single directory pass yielding (pdf_file, pdf_path, chapter, error) for each PDF
+    
+    chapter is the (chapter_id, chapter_name) returned by match_chapter or None,
+    error is the validation failure for a matched file or None.
+    """
+    
+    with os.scandir(pdf_folder) as entries:
+        for entry in entries:
+            if entry.name[-4:].lower() != '.pdf' or not entry.is_file():
+                continue
+            
+            chapter = match_chapter(entry.name)
+            error = None
+            if chapter:
+                try:
+                    file_size: Optional[int] = entry.stat().st_size
+                except OSError:
+                    file_size = None  # validate_pdf_file stats again and reports the error
+                error = validate_pdf_file(entry.path, file_size)
+            yield entry.name, entry.path, chapter, error
+
+def upload_chapters_concurrently(jobs: List[Tuple[str, str, str]], class_level: Union[int, str],
+                                 subject: str = "Mathematics", force: bool = False) -> Tuple[int, int]:
+    """Upload (pdf_path, chapter_id, chapter_name) jobs in parallel, return (uploaded, failed) counts"""
     
     uploaded_count = 0
     failed_count = 0
     
-    # Find PDF files in the folder
-    pdf_files = [f for f in os.listdir(pdf_folder) if f.lower().endswith('.pdf')]
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_UPLOADS) as executor:
+        futures = [
+            executor.submit(upload_chapter_pdf, pdf_path, class_level, chapter_id, chapter_name, subject, force)
+            for pdf_path, chapter_id, chapter_name in jobs
+        ]
+        
+        try:
+            for future in as_completed(futures):
+                if future.result().get('success'):
+                    uploaded_count += 1
+                else:
+                    failed_count += 1
+        except BaseException:
+            # Ctrl+C or an unexpected error: drop queued uploads, let in-flight ones finish
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
     
-    if not pdf_files:
-        print("❌ No PDF files found in the folder")
+    return uploaded_count, failed_count
+
+def batch_upload_chapters(pdf_folder: str, class_level: Union[int, str], subject: str = "Mathematics",
+                          force: bool = False) -> None:
+    """Upload all chapter PDFs from a folder"""
+    
+    _ensure_logging()
+    if not Path(pdf_folder).is_dir():
+        logger.error(f"❌ Folder not found: {pdf_folder}")
         return
     
-    print(f"📁 Found {len(pdf_files)} PDF files")
-    print()
+    logger.info(f"🚀 Starting batch upload from: {pdf_folder}")
+    logger.info(f"📚 Class: {class_level}, Subject: {subject}")
+    logger.info("=" * 60)
+    
+    total_files = 0
+    uploaded_count = 0
+    failed_count = 0
     
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(pdf_folder, pdf_file)
+    jobs = []
+    for pdf_file, pdf_path, chapter, error in iter_chapter_files(pdf_folder, match_mapped_chapter):
+        total_files += 1
         
         # Check if we have mapping for this file
-        if pdf_file in CHAPTER_MAPPING:
-            chapter_id, chapter_name = CHAPTER_MAPPING[pdf_file]
-            
-            # Upload the chapter
-            result = upload_chapter_pdf(pdf_path, class_level, chapter_id, chapter_name, subject)
-            
-            if result.get('success'):
-                uploaded_count += 1
-            else:
-                failed_count += 1
-                
-        else:
-            print(f"⚠️  SKIPPING {pdf_file} - No mapping found")
-            print(f"   Add it to CHAPTER_MAPPING in this script")
+        if chapter is None:
+            logger.warning(f"⚠️  SKIPPING {pdf_file} - No mapping found")
+            logger.warning(f"   Add it to CHAPTER_MAPPING in this script")
             failed_count += 1
-        
-        print()  # Empty line for readability
-        time.sleep(2)  # Small delay between uploads
+        elif error:
+            logger.warning(f"⚠️  SKIPPING {pdf_file} - {error}")
+            failed_count += 1
+        else:
+            jobs.append((pdf_path, *chapter))
     
-    print("=" * 60)
-    print(f"📊 Upload Summary:")
-    print(f"   ✅ Successful: {uploaded_count}")
-    print(f"   ❌ Failed: {failed_count}")
-    print(f"   📁 Total files: {len(pdf_files)}")
+    if not total_files:
+        logger.error("❌ No PDF files found in the folder")
+        return
+    
+    logger.info(f"📁 Found {total_files} PDF files")
+    logger.info("")
+    
+    # Upload the mapped chapters
+    uploaded, failed = upload_chapters_concurrently(jobs, class_level, subject, force)
+    uploaded_count += uploaded
+    failed_count += failed
+    
+    logger.info("")
+    logger.info("=" * 60)
+    logger.info(f"📊 Upload Summary:")
+    logger.info(f"   ✅ Successful: {uploaded_count}")
+    logger.info(f"   ❌ Failed: {failed_count}")
+    logger.info(f"   📁 Total files: {total_files}")
 
-def auto_detect_and_upload(pdf_folder, class_level, subject="Mathematics"):
+def auto_detect_and_upload(pdf_folder: str, class_level: Union[int, str], subject: str = "Mathematics",
+                           force: bool = False) -> None:
     """Auto-detect chapter PDFs based on filename patterns"""
     
-    if not os.path.exists(pdf_folder):
-        print(f"❌ Folder not found: {pdf_folder}")
+    _ensure_logging()
+    if not Path(pdf_folder).is_dir():
+        logger.error(f"❌ Folder not found: {pdf_folder}")
         return
     
-    # Auto-detection patterns
-    patterns = {
-        'real': ('real_numbers', 'বাস্তব সংখ্যা (Real Numbers)'),
-        'set': ('sets_functions', 'সেট ও ফাংশন (Sets and Functions)'),
-        'algebra': ('algebraic_expressions', 'বীজগাণিতিক রাশি (Algebraic Expressions)'),
-        'indic': ('indices_logarithms', 'সূচক ও লগারিদম (Indices and Logarithms)'),
-        'linear': ('linear_equations', 'এক চলকবিশিষ্ট সমীকরণ (Linear Equations)'),
-        'line': ('lines_angles_triangles', 'রেখা, কোণ ও ত্রিভুজ (Lines, Angles and Triangles)'),
-        'geometry': ('practical_geometry', 'ব্যবহারিক জ্যামিতি (Practical Geometry)'),
-        'circle': ('circles', 'বৃত্ত (Circles)'),
-        'trigon': ('trigonometric_ratios', 'ত্রিকোণমিতিক অনুপাত (Trigonometric Ratios)'),
-        'distance': ('distance_height', 'দূরত্ব ও উচ্চতা (Distance and Height)'),
-        'ratio': ('algebraic_ratios', 'বীজগাণিতিক অনুপাত ও সমানুপাত (Algebraic Ratios)'),
-        'simultaneous': ('simultaneous_equations', 'দুই চলকবিশিষ্ট সরল সহসমীকরণ (Simultaneous Linear Equations)'),
-        'finite': ('finite_series', 'সসীম ধারা (Finite Series)'),
-        'similarity': ('ratio_similarity_symmetry', 'অনুপাত, সদৃশতা ও প্রতিসমতা (Ratio, Similarity and Symmetry)'),
-        'area': ('area_theorems', 'ক্ষেত্রফল সম্পর্কিত উপপাদ্য ও সম্পাদ্য (Area Related Theorems)'),
-        'mensur': ('mensuration', 'পরিমিতি (Mensuration)'),
-        'statistic': ('statistics', 'পরিসংখ্যান (Statistics)'),
-    }
-    
-    print(f"🤖 Auto-detecting chapters in: {pdf_folder}")
-    print(f"📚 Class: {class_level}, Subject: {subject}")
-    print("=" * 60)
+    logger.info(f"🤖 Auto-detecting chapters in: {pdf_folder}")
+    logger.info(f"📚 Class: {class_level}, Subject: {subject}")
+    logger.info("=" * 60)
     
-    pdf_files = [f for f in os.listdir(pdf_folder) if f.lower().endswith('.pdf')]
+    total_files = 0
     uploaded_count = 0
     failed_count = 0
     
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(pdf_folder, pdf_file)
-        filename_lower = pdf_file.lower()
+    jobs = []
+    for pdf_file, pdf_path, chapter, error in iter_chapter_files(pdf_folder, detect_chapter):
+        total_files += 1
         
-        # Try to match patterns
-        matched = False
-        for pattern, (chapter_id, chapter_name) in patterns.items():
-            if pattern in filename_lower:
-                print(f"🎯 Detected: {pdf_file} → {chapter_name}")
-                
-                result = upload_chapter_pdf(pdf_path, class_level, chapter_id, chapter_name, subject)
-                
-                if result.get('success'):
-                    uploaded_count += 1
-                else:
-                    failed_count += 1
-                
-                matched = True
-                break
-        
-        if not matched:
-            print(f"❓ Could not detect chapter type for: {pdf_file}")
+        if chapter is None:
+            logger.warning(f"❓ Could not detect chapter type for: {pdf_file}")
             failed_count += 1
-        
-        print()
-        time.sleep(2)
+        elif error:
+            logger.warning(f"⚠️  SKIPPING {pdf_file} - {error}")
+            failed_count += 1
+        else:
+            logger.info(f"🎯 Detected: {pdf_file} → {chapter[1]}")
+            jobs.append((pdf_path, *chapter))
     
-    print("=" * 60)
-    print(f"📊 Auto-Upload Summary:")
-    print(f"   ✅ Successful: {uploaded_count}")
-    print(f"   ❌ Failed/Undetected: {failed_count}")
-    print(f"   📁 Total files: {len(pdf_files)}")
+    uploaded, failed = upload_chapters_concurrently(jobs, class_level, subject, force)
+    uploaded_count += uploaded
+    failed_count += failed
+    
+    logger.info("")
+    logger.info("=" * 60)
+    logger.info(f"📊 Auto-Upload Summary:")
+    logger.info(f"   ✅ Successful: {uploaded_count}")
+    logger.info(f"   ❌ Failed/Undetected: {failed_count}")
+    logger.info(f"   📁 Total files: {total_files}")
 
 if __name__ == "__main__":
     print("📚 Chapter PDF Batch Upload Tool")
@@ -195,6 +519,7 @@ if __name__ == "__main__":
     PDF_FOLDER = "chapters"  # Folder containing your chapter PDFs
     CLASS_LEVEL = 9          # Class 9 or 10
     SUBJECT = "Mathematics"  # Subject name
+    FORCE = "--force" in sys.argv[1:]  # Re-upload even chapters the upload cache marks as done
     
     print("Choose upload method:")
     print("1. Batch upload with filename mapping")
@@ -203,21 +528,29 @@ if __name__ == "__main__":
     
     choice = input("\nEnter choice (1-3): ").strip()
     
-    if choice == "1":
-        batch_upload_chapters(PDF_FOLDER, CLASS_LEVEL, SUBJECT)
-        
-    elif choice == "2":
-        auto_detect_and_upload(PDF_FOLDER, CLASS_LEVEL, SUBJECT)
-        
-    elif choice == "3":
-        pdf_path = input("Enter PDF file path: ").strip()
-        chapter_id = input("Enter chapter ID (e.g., real_numbers): ").strip()
-        chapter_name = input("Enter chapter name: ").strip()
-        
-        result = upload_chapter_pdf(pdf_path, CLASS_LEVEL, chapter_id, chapter_name, SUBJECT)
-        print("Result:", result)
-        
-    else:
-        print("❌ Invalid choice")
+    log_listener = setup_logging()
+    try:
+        if choice == "1":
+            batch_upload_chapters(PDF_FOLDER, CLASS_LEVEL, SUBJECT, FORCE)
+            
+        elif choice == "2":
+            auto_detect_and_upload(PDF_FOLDER, CLASS_LEVEL, SUBJECT, FORCE)
+            
+        elif choice == "3":
+            pdf_path = input("Enter PDF file path: ").strip()
+            
+            if Path(pdf_path).is_file():
+                chapter_id = input("Enter chapter ID (e.g., real_numbers): ").strip()
+                chapter_name = input("Enter chapter name: ").strip()
+                
+                result = upload_chapter_pdf(pdf_path, CLASS_LEVEL, chapter_id, chapter_name, SUBJECT, FORCE)
+                logger.info(f"Result: {result}")
+            else:
+                logger.error(f"❌ File not found: {pdf_path}")
+            
+        else:
+            logger.error("❌ Invalid choice")
+    finally:
+        log_listener.stop()  # flushes any queued messages
     
     print("\n🎉 Upload process completed!")
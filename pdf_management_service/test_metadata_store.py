@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test script for the chapter metadata store (SQLite with the JSON copy)
+Runs against a temporary data directory; no Firebase/Pinecone/OpenAI needed
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+# Import the service module without it building its own manager on the real data directory
+os.environ['PDF_MANAGER_NO_AUTOSTART'] = '1'
+from chapter_pdf_manager import ChapterPDFManager
+
+SAMPLE_METADATA = {
+    'class_9': {
+        'real_numbers': {'chapter_name': 'Real Numbers', 'chunks_count': 12},
+        'sets_functions': {'chapter_name': 'Sets and Functions', 'chunks_count': 8}
+    }
+}
+
+def make_manager(data_dir):
+    """Build a manager whose stores live in data_dir, skipping the remote services"""
+    return ChapterPDFManager(data_dir=data_dir, connect_services=False)
+
+def read_json(data_dir):
+    with open(os.path.join(data_dir, 'chapter_metadata.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+def check_legacy_import(data_dir):
+    """The legacy JSON file is imported into SQLite on first start"""
+    print("📦 Testing legacy JSON import...")
+    with open(os.path.join(data_dir, 'chapter_metadata.json'), 'w', encoding='utf-8') as f:
+        json.dump(SAMPLE_METADATA, f)
+    
+    manager = make_manager(data_dir)
+    if not manager.metadata_db or manager.chapter_metadata != SAMPLE_METADATA:
+        print("❌ Legacy metadata was not imported")
+        return False
+    
+    # A second start must read the imported rows from SQLite, not the JSON file
+    os.remove(manager.metadata_file)
+    manager.metadata_db.close()
+    if make_manager(data_dir).chapter_metadata != SAMPLE_METADATA:
+        print("❌ Imported metadata did not survive a restart")
+        return False
+    print("✅ Legacy metadata imported once and read back from SQLite")
+    return True
+
+def check_entry_write(data_dir):
+    """A single-entry write reaches SQLite and, once exported, the JSON copy"""
+    print("\n✏️  Testing per-entry write...")
+    manager = make_manager(data_dir)
+    manager.chapter_metadata.setdefault('class_10', {})['statistics'] = {'chapter_name': 'Statistics'}
+    manager._save_metadata('class_10', 'statistics')
+    manager.flush_metadata_export()
+    manager.metadata_db.close()
+    
+    if make_manager(data_dir).chapter_metadata.get('class_10', {}).get('statistics') != {'chapter_name': 'Statistics'}:
+        print("❌ Entry missing from SQLite after save")
+        return False
+    if 'statistics' not in read_json(data_dir).get('class_10', {}):
+        print("❌ Entry missing from the JSON copy")
+        return False
+    print("✅ Entry written to SQLite and the JSON copy")
+    return True
+
+def check_entry_delete(data_dir):
+    """Removing an entry and saving it deletes the row and, once exported, the JSON entry"""
+    print("\n🗑️  Testing per-entry delete...")
+    manager = make_manager(data_dir)
+    del manager.chapter_metadata['class_9']['real_numbers']
+    manager._save_metadata('class_9', 'real_numbers')
+    manager.flush_metadata_export()
+    manager.metadata_db.close()
+    
+    if 'real_numbers' in make_manager(data_dir).chapter_metadata.get('class_9', {}):
+        print("❌ Deleted entry still in SQLite")
+        return False
+    if 'real_numbers' in read_json(data_dir).get('class_9', {}):
+        print("❌ Deleted entry still in the JSON copy")
+        return False
+    print("✅ Entry removed from SQLite and the JSON copy")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🔧 Chapter Metadata Store - Test")
+    print("=" * 50)
+    
+    # Checks run in order against one data directory (not named test_* so pytest skips them)
+    data_dir = tempfile.mkdtemp()
+    tests = [
+        check_legacy_import,
+        check_entry_write,
+        check_entry_delete,
+    ]
+    
+    passed = 0
+    try:
+        for test in tests:
+            if test(data_dir):
+                passed += 1
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    
+    print("=" * 50)
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)